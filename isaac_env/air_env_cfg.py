@@ -178,13 +178,16 @@ def pcd_capture(env):
     for cam_id in range(n_multiple_cam):
         depths = env.scene[f"camera_{cam_id}"].data.output["distance_to_image_plane"]
         depths = torch.clip(depths, 0, depth_max)
-        pcd_map = [create_pointcloud_from_depth(
-            intrinsic_matrix=env.scene[f"camera_{cam_id}"].data.intrinsic_matrices[env_id],
-            depth=depths[env_id],
-            position=get_camera_pose(env, cam_id, env_id)[:3],
-            orientation=get_camera_pose(env, cam_id, env_id)[3:],
-            device=env.device).view(cam_width, cam_height, 3).permute(1,0,2) for env_id in range(env.scene.num_envs)]
-        pcds.append(torch.stack(pcd_map, 0))
+        camera_pose = get_camera_pose(env, cam_id)
+        # Unproject the depth of all envs at once, the clipped depth has no invalid points
+        pcd_map = create_pointcloud_from_depth(
+            intrinsic_matrix=env.scene[f"camera_{cam_id}"].data.intrinsic_matrices,
+            depth=depths,
+            keep_invalid=True,
+            position=camera_pose[:, :3],
+            orientation=camera_pose[:, 3:],
+            device=env.device)
+        pcds.append(pcd_map.view(-1, cam_width, cam_height, 3).permute(0, 2, 1, 3))
     return torch.stack(pcds, 0).transpose(0, 1)
 
 
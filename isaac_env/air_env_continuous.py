@@ -28,7 +28,6 @@ from omni.isaac.lab.utils.math import subtract_frame_transforms, quat_mul, combi
 
 from metagraspnet.Scripts.visualize_labels import (
     create_contact_pose,
-    from_contact_to_6D,
     read_in_mesh_config,
 )
 
@@ -69,10 +68,30 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             robot_name, joint_names=ARM_JOINT, body_names=ee_name
         )
         self.objs = [self.scene[object_name + f"_{i}"] for i in range(num_objs)]
+        # Stacked object root states (num_envs, num_objs, 13), gathered at most once per physics step
+        self._obj_root_state_buf = torch.empty((self.num_envs, num_objs, 13), device=self.device)
+        # physics step at which the object root states were last gathered, -1 marks them stale
+        self._obj_root_state_step = -1
+        # Object position w.r.t. the robot base and velocity measure, filled in place by update_env_state
+        self._obj_pos_buf = torch.empty((self.num_envs, num_objs, 3), device=self.device)
+        self._obj_vel_buf = torch.empty((self.num_envs, num_objs), device=self.device)
+        # Reachable workspace bounds of the objects w.r.t. the robot base (x, y, z)
+        self._bounds_lo = torch.tensor(
+            (ee_goals_default[0][0], ee_goals_default[1][0], -5e-2), device=self.device
+        )
+        self._bounds_hi = torch.tensor(
+            (ee_goals_default[0][1], ee_goals_default[1][1], obj_height_limit), device=self.device
+        )
 
         # initialize state machine
         self.sm_dt = torch.full((self.num_envs,), self.dt, device=self.device)
         self.sm_state = torch.full((self.num_envs,), 2, dtype=torch.int32, device=self.device)
+        # states in which the arm holds its initial joint positions
+        self._zero_states = torch.tensor(
+            [STATE_MACHINE["init"], STATE_MACHINE["init_env"], STATE_MACHINE["start"]],
+            dtype=torch.int32,
+            device=self.device,
+        )
         self.sm_wait_time = torch.zeros((self.num_envs,), device=self.device)
 
         # desired state
@@ -85,6 +104,22 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         self.sm_state_wp = wp.from_torch(self.sm_state, wp.int32)
         self.sm_wait_time_wp = wp.from_torch(self.sm_wait_time, wp.float32)
         self.des_ee_pose_wp = wp.from_torch(self.des_ee_pose, wp.transform)
+        # warp reads transforms as (x, y, z, qx, qy, qz, qw), the poses are permuted into
+        # persistent contiguous buffers so their warp views are created only once
+        self._xyzw_index = torch.tensor([0, 1, 2, 4, 5, 6, 3], device=self.device)
+        self._wxyz_index = torch.tensor([0, 1, 2, 6, 3, 4, 5], device=self.device)
+        self._ee_pose_buf = torch.zeros((self.num_envs, 7), device=self.device)
+        self._grasp_pose_buf = torch.zeros((self.num_envs, 7), device=self.device)
+        self._des_ee_pose_wxyz_buf = torch.zeros((self.num_envs, 7), device=self.device)
+        self._ee_pose_wp = wp.from_torch(self._ee_pose_buf, wp.transform)
+        self._grasp_pose_wp = wp.from_torch(self._grasp_pose_buf, wp.transform)
+        # persistent state inputs of the kernel, refreshed in place every step so the warp views stay valid
+        self._ee_vel_buf = torch.zeros((self.num_envs,), device=self.device)
+        self._env_reachable_buf = torch.zeros((self.num_envs,), dtype=torch.bool, device=self.device)
+        self._env_reachable_and_stable_buf = torch.zeros((self.num_envs,), dtype=torch.bool, device=self.device)
+        self._ee_vel_wp = wp.from_torch(self._ee_vel_buf, wp.float32)
+        self._env_reachable_wp = wp.from_torch(self._env_reachable_buf, wp.bool)
+        self._env_reachable_and_stable_wp = wp.from_torch(self._env_reachable_and_stable_buf, wp.bool)
         self.des_gripper_state_wp = wp.from_torch(self.des_gripper_state, wp.float32)
 
         self.ee_quat_default = torch.tensor(
@@ -166,6 +201,12 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         else:
             self.ee_jacobi_idx = self.robot_entity_cfg.body_ids[0]
 
+        # Cache the resolved arm joint ids as a device tensor and the end-effector body id as an int
+        self._joint_ids_t = torch.as_tensor(
+            self.robot_entity_cfg.joint_ids, dtype=torch.int64, device=self.device
+        )
+        self._body_id = int(self.robot_entity_cfg.body_ids[0])
+
         # Get initial joint positions
         self.joint_pos_init = self.robot.data.default_joint_pos.clone()
         self.joint_vel_init = self.robot.data.default_joint_vel.clone()
@@ -186,6 +227,9 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         )
 
         self.obj_drop_pose = torch.tensor(obj_drop_pose, device=self.device)[None, ...]
+        # Drop pose of every env in the world frame, the env origins are fixed after the scene is cloned
+        self._drop_pose_cache = self.obj_drop_pose.repeat(self.num_envs, 1)
+        self._drop_pose_cache[:, :3] += self.scene.env_origins
 
         # grasp and approach pose
         self.grasp_pose = torch.zeros((self.num_envs, 7), device=self.device)
@@ -202,32 +246,22 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             env_reachable: The environments that are reachable.
             env_reachable_and_stable: The environments that are reachable and stable.
         """
-        # Grasp target recorder (position only)
-        object_pos = torch.zeros((self.num_envs, num_objs, 4), device=self.device)
-
-        for id_obj in range(num_objs):
-            # Record the object position
-            object_pos[:, id_obj, :3] = self._get_obj_pos(id_obj)
-            # Record the object velocity
-            obj_vel_b = self._get_obj_vel(id_obj)
-            object_pos[:, id_obj, -1] = torch.mean(torch.abs(obj_vel_b), -1)
-
-        # Object reachable
-        # Initial condition: Check if the object is below a certain height limit
-        self.obj_reachable = (
-            (object_pos[:, :, 2] < obj_height_limit)
-            & (object_pos[:, :, 2] > -5e-2)
-            & (object_pos[:, :, 0] > ee_goals_default[0][0])
-            & (object_pos[:, :, 0] < ee_goals_default[0][1])
-            & (object_pos[:, :, 1] > ee_goals_default[1][0])
-            & (object_pos[:, :, 1] < ee_goals_default[1][1])
+        # Record the object states of all objects at once
+        obj_root_state = self._get_obj_root_state()
+        # Object position w.r.t. the robot base
+        object_pos = torch.sub(
+            obj_root_state[..., 0:3], self.robot.data.root_state_w[:, None, 0:3], out=self._obj_pos_buf
+        )
+        # Object velocity, mean absolute value as the L1 norm over the 6 components
+        object_vel = torch.linalg.vector_norm(
+            obj_root_state[..., 7:], ord=1, dim=-1, out=self._obj_vel_buf
+        ).div_(6)
+
+        # Object reachable: inside the workspace bounds and below the height limit
+        # Object stable: either slow speed or not reachable
+        self.obj_reachable, self.obj_stable = compute_obj_reachable_stable(
+            object_pos, object_vel, self._bounds_lo, self._bounds_hi, obj_vel_limit
         )
-
-        # Object stable
-        self.obj_stable = object_pos[:, :, -1] < obj_vel_limit
-
-        # Stable objects are either slow speed or not reachable
-        self.obj_stable = self.obj_stable | ~self.obj_reachable
 
         # At least one object is reachable
         self.env_reachable = self.obj_reachable.any(dim=1)
@@ -249,21 +283,14 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
     def _advance_state_machine(self):
         """Compute the desired state of the robot's end-effector and the gripper."""
 
-        # get the end-effector velocity
-        ee_vel = self._get_ee_vel()
+        # refresh the end-effector velocity and the environment states in place
+        self._ee_vel_buf.copy_(self._get_ee_vel())
+        self._env_reachable_buf.copy_(self.env_reachable)
+        self._env_reachable_and_stable_buf.copy_(self.env_reachable_and_stable)
 
-        # convert all transformations from (w, x, y, z) to (x, y, z, w)
-        ee_pose = self._get_ee_pose()[:, [0, 1, 2, 4, 5, 6, 3]]
-        self.grasp_pose = self.grasp_pose[:, [0, 1, 2, 4, 5, 6, 3]]
-
-        # convert to warp
-        ee_pose_wp = wp.from_torch(ee_pose.contiguous(), wp.transform)
-        ee_vel_wp = wp.from_torch(ee_vel, wp.float32)
-        env_reachable_wp = wp.from_torch(self.env_reachable.contiguous(), wp.bool)
-        env_reachable_and_stable_wp = wp.from_torch(
-            self.env_reachable_and_stable.contiguous(), wp.bool
-        )
-        grasp_pose_wp = wp.from_torch(self.grasp_pose, wp.transform)
+        # convert all transformations from (w, x, y, z) to (x, y, z, w) in place
+        torch.index_select(self._get_ee_pose(), 1, self._xyzw_index, out=self._ee_pose_buf)
+        torch.index_select(self.grasp_pose, 1, self._xyzw_index, out=self._grasp_pose_buf)
 
         wp.launch(
                 kernel=infer_state_machine_con,
@@ -278,17 +305,17 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
                     self.epi_count_wp,
                     self.step_count_wp,
                     # environment physical states
-                    env_reachable_wp,
-                    env_reachable_and_stable_wp,
+                    self._env_reachable_wp,
+                    self._env_reachable_and_stable_wp,
                     # current robot end effector state
-                    ee_pose_wp,
-                    ee_vel_wp,
+                    self._ee_pose_wp,
+                    self._ee_vel_wp,
                     # desired robot end effector state
                     self.des_ee_pose_wp,
                     self.des_gripper_state_wp,
                     self.ee_quat_default_wp,
                     # proposed grasp pose
-                    grasp_pose_wp,
+                    self._grasp_pose_wp,
                     self.gripper_state_con_wp,
                     # continuous control time recorder
                     self.advance_frame_con_wp,
@@ -298,9 +325,7 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             )
 
         # convert transformations back to (w, x, y, z)
-        des_ee_pose = self.des_ee_pose[:, [0, 1, 2, 6, 3, 4, 5]]
-        ee_pose = ee_pose[:, [0, 1, 2, 6, 3, 4, 5]]
-        self.grasp_pose = self.grasp_pose[:, [0, 1, 2, 6, 3, 4, 5]]
+        des_ee_pose = torch.index_select(self.des_ee_pose, 1, self._wxyz_index, out=self._des_ee_pose_wxyz_buf)
 
         # convert to torch
         return torch.cat((des_ee_pose, self.des_gripper_state.unsqueeze(-1)), -1)
@@ -311,15 +336,13 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             joint_pos_des, joint_vel_des = self.controller.compute()
         else:
             jacobian = self.robot.root_physx_view.get_jacobians()[
-                :, self.ee_jacobi_idx, :, self.robot_entity_cfg.joint_ids
-            ]
+                :, self.ee_jacobi_idx
+            ].index_select(-1, self._joint_ids_t)
 
-            joint_pos = self.robot.data.joint_pos[:, self.robot_entity_cfg.joint_ids]
+            joint_pos = self.robot.data.joint_pos.index_select(1, self._joint_ids_t)
 
-            ee_pose_w = self.robot.data.body_state_w[
-                :, self.robot_entity_cfg.body_ids[0], 0:7
-            ].clone()
-            root_pose_w = self.robot.data.root_state_w[:, 0:7].clone()
+            ee_pose_w = self.robot.data.body_state_w[:, self._body_id, 0:7]
+            root_pose_w = self.robot.data.root_state_w[:, 0:7]
 
             ee_pos_b, ee_quat_b = subtract_frame_transforms(
                 root_pose_w[:, 0:3],
@@ -335,18 +358,15 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
 
         joint_pos_des_rel = joint_pos_des - self.joint_pos_init[:, :6]
 
-        joint_pos_des_rel[self.sm_state == STATE_MACHINE["init"]] *= 0.0
-        joint_pos_des_rel[self.sm_state == STATE_MACHINE["init_env"]] *= 0.0
-        joint_pos_des_rel[self.sm_state == STATE_MACHINE["start"]] *= 0.0
+        zero_mask = (self.sm_state.unsqueeze(1) == self._zero_states).any(1)
+        joint_pos_des_rel.mul_((~zero_mask).to(joint_pos_des_rel.dtype).unsqueeze(1))
 
         return joint_pos_des_rel
 
     def step(self, grasp_pose, policy_inference_criteria=torch.tensor([])):
         # Get the grasp pose from the policy
-        self.grasp_pose, self.gripper_state_con = (
-                grasp_pose[:, :7],
-                grasp_pose[:, -1],
-            )
+        self.grasp_pose.copy_(grasp_pose[:, :7])
+        self.gripper_state_con = grasp_pose[:, -1]
 
         # Loop until the simulation frames until policy inference criteria is met
         while not policy_inference_criteria.any():
@@ -540,28 +560,47 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         self._reset_robot(init_id)
         self._reset_idx(init_env_id)
 
+    def _reset_idx(self, env_ids):
+        super()._reset_idx(env_ids)
+        # the reset events move the objects, gather their states again on the next access
+        self._obj_root_state_step = -1
+
     def _record_reward(self, judge_reward):
         """Summarize the reward and print the success message."""
-        for i, env_success in enumerate(self.reward_buf):
-            if env_success and judge_reward[i]:
-                self.reward_recorder[
-                    i, self.epi_step_count[i, 0], self.epi_step_count[i, 1]
-                ] += self.reward_buf[i]
-                # Move object to somewhere away from the bin
-                drop_pose_curr = self.obj_drop_pose.clone()
-                id_tensor = torch.tensor([i], device=self.device)
-                drop_pose_curr[:, :3] += self.scene.env_origins[i]
-                self.scene.rigid_objects[
-                    f"obj_{int(self.obj_chosen[i])}"
-                ].write_root_state_to_sim(drop_pose_curr, id_tensor)
-                print(
-                    f"[INFO] Env {i} succeeded in "
-                    + f"Episode {self.epi_step_count[i, 0]} "
-                    + f"Step {self.epi_step_count[i, 1]} ! "
-                    + f"Current reward: {torch.sum(self.reward_recorder[i, self.epi_step_count[i, 0]])} "
-                )
-                self.sm_state[i] = STATE_MACHINE["init"]
-                self.obj_chosen[i] = -1
+        success_ids = self.env_idx[self.reward_buf.bool() & judge_reward.bool()]
+        if len(success_ids) == 0:
+            return
+        episode = self.epi_step_count[success_ids, 0].long()
+        step = self.epi_step_count[success_ids, 1].long()
+        self.reward_recorder.index_put_(
+            (success_ids, episode, step), self.reward_buf[success_ids], accumulate=True
+        )
+
+        # Move object to somewhere away from the bin, one write per chosen object
+        drop_pose = self._drop_pose_cache[success_ids]
+        obj_chosen = self.obj_chosen[success_ids]
+        for obj_id in obj_chosen.unique().tolist():
+            # no object was chosen, nothing to move
+            if obj_id < 0:
+                continue
+            obj_mask = obj_chosen == obj_id
+            self.scene.rigid_objects[f"obj_{obj_id}"].write_root_state_to_sim(
+                drop_pose[obj_mask], success_ids[obj_mask]
+            )
+            self._obj_root_state_step = -1
+
+        current_reward = self.reward_recorder[success_ids, episode].sum(-1)
+        for i, epi, stp, reward in zip(
+            success_ids.tolist(), episode.tolist(), step.tolist(), current_reward.tolist()
+        ):
+            print(
+                f"[INFO] Env {i} succeeded in "
+                + f"Episode {epi} "
+                + f"Step {stp} ! "
+                + f"Current reward: {reward} "
+            )
+        self.sm_state[success_ids] = STATE_MACHINE["init"]
+        self.obj_chosen[success_ids] = -1
 
     def _reset_robot(self, robot_reset_id):
         """
@@ -585,7 +624,7 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         Visualize markers
         """
         # Obtain quantities from simulation
-        self.robot.data.body_state_w[:, self.robot_entity_cfg.body_ids[0], 0:7]
+        self.robot.data.body_state_w[:, self._body_id, 0:7]
         #
         
 
@@ -659,105 +698,131 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             obj_poses_robot = None
             print(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}: No object on the table")
             
+        # Same encoding as the data env: depth per image and point cloud per image and coordinate
+        # as uint8 with min/max metadata, normals as int8 scaled by 127
+        images = {
+            "rgb": rgbs,
+            "normal": quantize_normals_int8(normals) if normals is not None else None,
+            "instance": instances,
+        }
+        for key, data, dims in (("depth", depths, (1, 2, 3)), ("pcd", pcds, (1, 2))):
+            quantized = quantize_uint8(data, dims) if data is not None else (None, None, None)
+            images.update(zip((key, f"{key}_min", f"{key}_max"), quantized))
+
         data_to_save = {
                 f"camera_{cam_id}": {
                                     "camera_intrinsics": self.camera[cam_id].data.intrinsic_matrices[env_id],
                                     "camera_pose": self.get_camera_pose(cam_id, env_id),
-                                    "rgb": rgbs[cam_id] if rgbs is not None else None,
-                                    "depth": depths[cam_id] if pcds is not None else None,
-                                    "normal": normals[cam_id] if normals is not None else None,
-                                    "instance": instances[cam_id] if instances is not None else None,
                                     "id_to_labels": id_to_labels[cam_id] if id_to_labels is not None else None,
-                                    "pcd": pcds[cam_id] if pcds is not None else None,
-                                     } 
+                                    **{key: image[cam_id] for key, image in images.items() if image is not None},
+                                     }
                 for cam_id in range(n_multiple_cam)
             }
-        
+
         data_to_save["obj_poses_robot"] = obj_poses_robot
         data_to_save["obj_id"] = scene_obj_id
             
         if grasp_pose is not None:
             data_to_save["grasp_pose"] = grasp_pose
         
-        torch.save(data_to_save,f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}_data.pt")
+        write_scene_data(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}", data_to_save)
         print(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}_frame_{time.time()}: Saved data")
 
         
 
+    def _refresh_obj_root_state(self):
+        """Stack the root states of all objects into the (num_envs, num_objs, 13) buffer."""
+        torch.stack([obj.data.root_state_w for obj in self.objs], dim=1, out=self._obj_root_state_buf)
+        self._obj_root_state_step = self._sim_step_counter
+
+    def _get_obj_root_state(self):
+        """Root states of all objects, gathered at most once per physics step.
+
+        Writes of object states between physics steps (resets, drop poses) mark it stale,
+        the buffer is overwritten in place by the next refresh.
+        """
+        if self._obj_root_state_step != self._sim_step_counter:
+            self._refresh_obj_root_state()
+        return self._obj_root_state_buf
+
     def _get_obj_pos(self, id_obj):
-        root_pose_w = self.robot.data.root_state_w[:, 0:3].clone()
-        return self.objs[id_obj].data.root_state_w[:, 0:3].clone() - root_pose_w
+        root_pose_w = self.robot.data.root_state_w[:, 0:3]
+        return self._get_obj_root_state()[:, id_obj, 0:3] - root_pose_w
 
     def _get_obj_pose(self, id_obj, id_env):
-        root_pose_w = self.robot.data.root_state_w[id_env, 0:3].clone()
-        obj_pos = self.objs[id_obj].data.root_state_w[id_env, 0:3].clone() - root_pose_w
-        obj_quat = self.objs[id_obj].data.root_state_w[id_env, 3:7].clone()
-        return torch.cat((obj_pos, obj_quat), -1)
+        root_pose_w = self.robot.data.root_state_w[id_env, 0:3]
+        obj_state = self._get_obj_root_state()[id_env, id_obj]
+        obj_pos = obj_state[0:3] - root_pose_w
+        return torch.cat((obj_pos, obj_state[3:7]), -1)
 
     def _get_obj_vel(self, id_obj):
-        return self.objs[id_obj].data.root_state_w[:, 7:].clone()
+        # read-only view of the stacked object states, clone to keep it beyond the current step
+        return self._get_obj_root_state()[:, id_obj, 7:]
 
     def _get_ee_pose(self):
-        view_pos_rob = self.ee_frame.data.target_pos_source.clone()[:, 0, :]
-        view_quat_rob = self.ee_frame.data.target_quat_source.clone()[:, 0, :]
+        view_pos_rob = self.ee_frame.data.target_pos_source[:, 0, :]
+        view_quat_rob = self.ee_frame.data.target_quat_source[:, 0, :]
         return torch.cat((view_pos_rob, view_quat_rob), -1)
 
     def _get_ee_vel(self):
         ee_vel = self.robot.data.body_state_w[
-            :, self.robot_entity_cfg.body_ids[0], 7:
+            :, self._body_id, 7:
         ].clone()
         ee_vel_abs = torch.mean(torch.abs(ee_vel), -1)
         return ee_vel_abs
 
     def get_camera_pose(self, cam_id, env_id = None):
-        view_pos_w = self.scene[f"camera_{cam_id}"].data.pos_w.clone()
-        view_quat_w = self.scene[f"camera_{cam_id}"].data.quat_w_ros.clone()
-        view_pos_rob = view_pos_w - self.scene[robot_name].data.root_state_w[:, 0:3].clone()
+        view_pos_w = self.scene[f"camera_{cam_id}"].data.pos_w
+        view_quat_w = self.scene[f"camera_{cam_id}"].data.quat_w_ros
+        view_pos_rob = view_pos_w - self.scene[robot_name].data.root_state_w[:, 0:3]
         view_pose_rob = torch.cat((view_pos_rob, view_quat_w), -1)
         return view_pose_rob[env_id] if env_id is not None else view_pose_rob
 
     def get_pointcloud_map(self, ids, cam_id = 0, vis=True):
-        pcds = []
-        for env_id in ids:
-            depth = self.camera[cam_id].data.output["distance_to_image_plane"][env_id]
-            pointcloud = create_pointcloud_from_depth(
-                intrinsic_matrix=self.camera.data.intrinsic_matrices[env_id],
-                depth=depth,
-                position=self.camera[cam_id].data.pos_w[env_id],
-                orientation=self.camera[cam_id].data.quat_w_ros[env_id],
-                device=self.device,
-            )
-            if pointcloud.size()[0] > 0 and vis and self.sim.has_gui():
-                indices = torch.randperm(pointcloud.size()[0])[:5000]
-                sampled_point_cloud = pointcloud[indices]
-                self.pc_markers[env_id].visualize(translations=sampled_point_cloud)
-            pcds.append(pointcloud.view(cam_width, cam_height, 3).permute(1, 0, 2))
-        return pcds
+        # Unproject the depth of all requested envs at once, invalid points are kept to preserve the image layout
+        ids = torch.as_tensor(ids, dtype=torch.int64, device=self.device).view(-1)
+        camera_data = self.camera[cam_id].data
+        pointclouds = create_pointcloud_from_depth(
+            intrinsic_matrix=camera_data.intrinsic_matrices[ids],
+            depth=camera_data.output["distance_to_image_plane"][ids],
+            keep_invalid=True,
+            position=camera_data.pos_w[ids],
+            orientation=camera_data.quat_w_ros[ids],
+            device=self.device,
+        )
+        if vis and self.sim.has_gui():
+            for env_id, pointcloud in zip(ids.tolist(), pointclouds):
+                pointcloud = pointcloud[pointcloud.isfinite().all(-1)]
+                if pointcloud.size()[0] > 0:
+                    indices = torch.randperm(pointcloud.size()[0])[:5000]
+                    sampled_point_cloud = pointcloud[indices]
+                    self.pc_markers[env_id].visualize(translations=sampled_point_cloud)
+        return pointclouds.view(-1, cam_width, cam_height, 3).permute(0, 2, 1, 3)
 
     def rep_write(self, obs_buf, ids):
         # Get the view pose
         camera_info = self.camera.data.info
 
-        for id in ids:
-            episode, step = self.epi_step_count[id]
+        # Transfer only the rows of the requested envs to numpy, once for the whole batch
+        ids = torch.as_tensor(ids, dtype=torch.int64, device=self.device).view(-1)
+        single_cam_data = convert_dict_to_backend(
+            {key: data[ids] for key, data in obs_buf["policy"].items()}, backend="numpy"
+        )
+        epi_step = self.epi_step_count[ids].tolist()
 
+        for row, (id, (episode, step)) in enumerate(zip(ids.tolist(), epi_step)):
             # Write the replicator output
             rep_output = {"annotators": {}}
-            data_cam = {}
-            single_cam_data = convert_dict_to_backend(
-                obs_buf["policy"], backend="numpy"
-            )
-            for key, data in zip(single_cam_data.keys(), single_cam_data.values()):
+            for key, data in single_cam_data.items():
                 info = camera_info[id][key]
                 if info is not None:
                     rep_output["annotators"][key] = {
-                        "render_product": {"data": data[id], **info}
+                        "render_product": {"data": data[row], **info}
                     }
                 else:
                     rep_output["annotators"][key] = {
-                        "render_product": {"data": data[id]}
+                        "render_product": {"data": data[row]}
                     }
-                data_cam[key] = data
             rep_output["trigger_outputs"] = {
                 "on_time": f"epi_{episode}_step_{step}_env"
             }
@@ -801,17 +866,10 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         # Convert the dictionary to a DataFrame
         df_new_data = pd.DataFrame(data)
 
-        # Check if the Excel file exists
-        if os.path.exists(file_name):
-            # Read the existing data
-            df_existing = pd.read_csv(file_name)
-            # Append new data
-            df_combined = pd.concat([df_existing, df_new_data], ignore_index=True)
-            # Write combined data back to the Excel file
-            df_combined.to_csv(file_name, index=False)
-        else:
-            # If the file does not exist, create and write the data
-            df_new_data.to_csv(file_name, index=False)
+        # Append the new rows only, the header is written when the file is created
+        df_new_data.to_csv(
+            file_name, mode="a", header=not os.path.exists(file_name), index=False
+        )
 
 
     def get_grasp_poses_from_hdf5(self, obj_id, env_id, img, camera_pose):
@@ -828,60 +886,57 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             analytical=True,
         )
 
-        grasp_poses = []
-        for grasp in grasp_dict["paralleljaw_pregrasp_transform"]:
-            # Get the contact point and the second point on the gripper finger surface
-            approach_vec = torch.tensor(grasp[0:3], device=self.device) 
-            baseline = torch.tensor(grasp[3:6], device=self.device)
-            contact_pt = torch.tensor(grasp[6:9], device=self.device) / 100 
-            pt2 = contact_pt + baseline * grasp[9] / 100
-            grasp_pos = pt2 - approach_vec * 0.1
-
-            # Convert the grasp pose to 6D pose using the transformation matrix of the object from the simulation
-            grasp_pose_obj = from_contact_to_6D(grasp)
-            # Convert the transformation matrix to a pose vector
-            grasp_pose_obj = transformation_matrix_to_pose_vector(torch.Tensor(grasp_pose_obj)).to(self.device)
-            # Convert to meters
-            grasp_pose_obj[:3] = grasp_pos
-            
-            # Transform the grasp pose to the robot frame
-            obj_pose_w = self._get_obj_pose(self.obj_chosen[env_id], env_id)
-            grasp_pos, grasp_quat = combine_frame_transforms(obj_pose_w[:3], obj_pose_w[3:], grasp_pose_obj[:3], grasp_pose_obj[3:])
-            contact_pt, _ = combine_frame_transforms(obj_pose_w[:3], obj_pose_w[3:], contact_pt)
-            pt2, _ = combine_frame_transforms(obj_pose_w[:3], obj_pose_w[3:], pt2)
-            mid_pt = (contact_pt + pt2) / 2
-            
-            # Visualize the grasp pose
-            grasp_pos_img = robot_point_to_image(grasp_pos, camera_pose)
-            contact_pt_img = robot_point_to_image(contact_pt, camera_pose)
-            pt2_img = robot_point_to_image(pt2, camera_pose)
-            mid_pt_img = robot_point_to_image(mid_pt, camera_pose)
-            img = cv2.line(
-                img,
-                (int(contact_pt_img[0]), int(contact_pt_img[1])),
-                (int(pt2_img[0]), int(pt2_img[1])),
-                (0, 255, 0),
-                1,
-            )
-            img = cv2.line(
-                img,
-                (int(mid_pt_img[0]), int(mid_pt_img[1])),
-                (int(grasp_pos_img[0]), int(grasp_pos_img[1])),
-                (0, 0, 255),
-                1,
-            )
-            img = cv2.circle(
-                img, (int(mid_pt_img[0]), int(mid_pt_img[1])), 2, (0, 0, 0), -1
-            )
-            
-            grasp_poses.append(torch.cat((grasp_pos, grasp_quat), -1))
-        grasp_poses = torch.stack(grasp_poses)
-        cv2.imwrite(f"env_{env_id}_grasp_viz.png", img)
+        # Stack all grasps into one (N, 10) tensor: approach vector, baseline, contact point, width
+        grasps = torch.as_tensor(
+            np.asarray(grasp_dict["paralleljaw_pregrasp_transform"]), dtype=torch.float32, device=self.device
+        )
+
+        # Get the contact point and the second point on the gripper finger surface
+        approach_vec = grasps[:, 0:3]
+        baseline = grasps[:, 3:6]
+        contact_pt = grasps[:, 6:9] / 100
+        pt2 = contact_pt + baseline * grasps[:, 9:10] / 100
+        grasp_pos = pt2 - approach_vec * 0.1
+
+        # Orientation of the 6D grasp pose, the rotation columns are (baseline, approach x baseline, approach)
+        grasp_rot = torch.stack((baseline, torch.linalg.cross(approach_vec, baseline), approach_vec), dim=-1)
+        grasp_quat = quat_from_matrix(grasp_rot)
+
+        # Transform the grasp poses to the robot frame
+        obj_pose_w = self._get_obj_pose(self.obj_chosen[env_id], env_id).expand(len(grasps), -1)
+        grasp_pos, grasp_quat = combine_frame_transforms(obj_pose_w[:, :3], obj_pose_w[:, 3:], grasp_pos, grasp_quat)
+        contact_pt, _ = combine_frame_transforms(obj_pose_w[:, :3], obj_pose_w[:, 3:], contact_pt)
+        pt2, _ = combine_frame_transforms(obj_pose_w[:, :3], obj_pose_w[:, 3:], pt2)
+        mid_pt = (contact_pt + pt2) / 2
+        grasp_poses = torch.cat((grasp_pos, grasp_quat), -1)
 
         # Get grasp with maximum grasp score
-        grasp_pose = grasp_poses[
-            grasp_dict["paralleljaw_pregrasp_score"].index(
-                max(grasp_dict["paralleljaw_pregrasp_score"])
-            )]
+        best = int(np.argmax(grasp_dict["paralleljaw_pregrasp_score"]))
+        grasp_pose = grasp_poses[best]
+
+        # Visualize the best grasp pose
+        grasp_pos_img = robot_point_to_image(grasp_pos[best], camera_pose)
+        contact_pt_img = robot_point_to_image(contact_pt[best], camera_pose)
+        pt2_img = robot_point_to_image(pt2[best], camera_pose)
+        mid_pt_img = robot_point_to_image(mid_pt[best], camera_pose)
+        img = cv2.line(
+            img,
+            (int(contact_pt_img[0]), int(contact_pt_img[1])),
+            (int(pt2_img[0]), int(pt2_img[1])),
+            (0, 255, 0),
+            1,
+        )
+        img = cv2.line(
+            img,
+            (int(mid_pt_img[0]), int(mid_pt_img[1])),
+            (int(grasp_pos_img[0]), int(grasp_pos_img[1])),
+            (0, 0, 255),
+            1,
+        )
+        img = cv2.circle(
+            img, (int(mid_pt_img[0]), int(mid_pt_img[1])), 2, (0, 0, 0), -1
+        )
+        cv2.imwrite(f"env_{env_id}_grasp_viz.png", img)
+
         self.pc_markers[env_id].visualize(translations=grasp_poses[:, :3])
         return grasp_pose
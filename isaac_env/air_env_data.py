@@ -9,6 +9,8 @@ from __future__ import annotations
 
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import Dict, Tuple, Union
 
 import cv2
@@ -28,7 +30,6 @@ from omni.isaac.lab.utils.math import subtract_frame_transforms, quat_mul, combi
 
 from metagraspnet.Scripts.visualize_labels import (
     create_contact_pose,
-    from_contact_to_6D,
     read_in_mesh_config,
 )
 
@@ -70,10 +71,32 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             robot_name, joint_names=ARM_JOINT, body_names=ee_name
         )
         self.objs = [self.scene[object_name + f"_{i}"] for i in range(num_objs)]
+        # Object data handles, stacked into one (num_envs, num_objs, 13) tensor per step
+        self._obj_root_views = [obj.data for obj in self.objs]
+        self._obj_root_state_buf = torch.empty((self.num_envs, num_objs, 13), device=self.device)
+        # Object position w.r.t. the robot base and velocity measure, filled in place by update_env_state
+        self._obj_pos_buf = torch.empty((self.num_envs, num_objs, 3), device=self.device)
+        self._obj_vel_buf = torch.empty((self.num_envs, num_objs), device=self.device)
+        # Robot base position, the root state buffer is re-created by the sim so the view is refreshed every step
+        self._robot_root_pos_view = self.robot.data.root_state_w[:, :3]
+
+        # Reachable workspace bounds of the objects w.r.t. the robot base (x, y, z)
+        self._bounds_lo = torch.tensor(
+            (ee_goals_default[0][0], ee_goals_default[1][0], -5e-2), device=self.device
+        )
+        self._bounds_hi = torch.tensor(
+            (ee_goals_default[0][1], ee_goals_default[1][1], obj_height_limit), device=self.device
+        )
 
         # initialize state machine
         self.sm_dt = torch.full((self.num_envs,), self.dt, device=self.device)
         self.sm_state = torch.full((self.num_envs,), 2, dtype=torch.int32, device=self.device)
+        # states in which the arm holds its initial joint positions
+        self._zero_states = torch.tensor(
+            [STATE_MACHINE["init"], STATE_MACHINE["init_env"], STATE_MACHINE["start"]],
+            dtype=torch.int32,
+            device=self.device,
+        )
         self.sm_wait_time = torch.zeros((self.num_envs,), device=self.device)
 
         # desired state
@@ -85,8 +108,14 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         self.sm_dt_wp = wp.from_torch(self.sm_dt, wp.float32)
         self.sm_state_wp = wp.from_torch(self.sm_state, wp.int32)
         self.sm_wait_time_wp = wp.from_torch(self.sm_wait_time, wp.float32)
-        self.des_ee_pose_wp = wp.from_torch(self.des_ee_pose, wp.transform)
+        # poses are kept in (w, x, y, z) order, the kernel reads the quaternion natively
+        self.des_ee_pose_wp = wp.from_torch(self.des_ee_pose, wp.float32)
         self.des_gripper_state_wp = wp.from_torch(self.des_gripper_state, wp.float32)
+        # persistent kernel inputs, refreshed in place every step so the warp views stay valid
+        self._ee_pose_buf = torch.zeros((self.num_envs, 7), device=self.device)
+        self._env_reachable_and_stable_buf = torch.zeros((self.num_envs,), dtype=torch.bool, device=self.device)
+        self._ee_pose_wp = wp.from_torch(self._ee_pose_buf, wp.float32)
+        self._env_reachable_and_stable_wp = wp.from_torch(self._env_reachable_and_stable_buf, wp.bool)
 
         # Successive grasp failure recorder, this is just placeholder
         self.successive_grasp_failure = torch.zeros(self.num_envs, device=self.device)
@@ -120,6 +149,12 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         else:
             self.ee_jacobi_idx = self.robot_entity_cfg.body_ids[0]
 
+        # Cache the resolved arm joint ids as a device tensor and the end-effector body id as an int
+        self._joint_ids_t = torch.as_tensor(
+            self.robot_entity_cfg.joint_ids, dtype=torch.int64, device=self.device
+        )
+        self._body_id = int(self.robot_entity_cfg.body_ids[0])
+
         # Get initial joint positions
         self.joint_pos_init = self.robot.data.default_joint_pos.clone()
         self.joint_vel_init = self.robot.data.default_joint_vel.clone()
@@ -140,6 +175,9 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         )
 
         self.obj_drop_pose = torch.tensor(obj_drop_pose, device=self.device)[None, ...]
+        # Drop pose of every env in the world frame, the env origins are fixed after the scene is cloned
+        self._drop_pose_cache = self.obj_drop_pose.repeat(self.num_envs, 1)
+        self._drop_pose_cache[:, :3] += self.scene.env_origins
 
         # grasp and approach pose
         self.grasp_pose = torch.zeros((self.num_envs, 7), device=self.device)
@@ -147,6 +185,20 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             (self.num_envs,), -1, dtype=torch.int64, device=self.device
         )
 
+        # Asynchronous data saving: images are converted on a side stream, copied
+        # into pinned host staging buffers and written to disk by a thread pool
+        self._use_cuda = "cuda" in str(self.device)
+        self._save_stream = torch.cuda.Stream(device=self.device) if self._use_cuda else None
+        n_save_workers = 4
+        self._save_executor = ThreadPoolExecutor(max_workers=n_save_workers)
+        # one staging slot per worker, a slot is reused only after its file is written
+        self._save_staging = [{} for _ in range(n_save_workers)]
+        self._save_futures = [None] * n_save_workers
+        self._save_slot = 0
+
+        # physics step at which the object root states were last gathered, -1 marks them stale
+        self._obj_root_state_step = -1
+
     def update_env_state(self):
         """Update the environment state before taking action.
         Args:
@@ -156,33 +208,20 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             env_reachable: The environments that are reachable.
             env_reachable_and_stable: The environments that are reachable and stable.
         """
-        # Grasp target recorder (position only)
-        object_pos = torch.zeros((self.num_envs, num_objs, 4), device=self.device)
-
-        for id_obj in range(num_objs):
-            # Record the object position
-            object_pos[:, id_obj, :3] = self._get_obj_pos(id_obj)
-            # Record the object velocity
-            obj_vel_b = self._get_obj_vel(id_obj)
-            object_pos[:, id_obj, -1] = torch.mean(torch.abs(obj_vel_b), -1)
-
-        # Object reachable
-        # Initial condition: Check if the object is below a certain height limit
-        self.obj_reachable = (
-            (object_pos[:, :, 2] < obj_height_limit)
-            & (object_pos[:, :, 2] > -5e-2)
-            & (object_pos[:, :, 0] > ee_goals_default[0][0])
-            & (object_pos[:, :, 0] < ee_goals_default[0][1])
-            & (object_pos[:, :, 1] > ee_goals_default[1][0])
-            & (object_pos[:, :, 1] < ee_goals_default[1][1])
+        # Root states of all objects at once, also refreshes the robot base view of the helpers below
+        obj_root_state = self._get_obj_root_state()
+
+        # Object position w.r.t. the robot base
+        object_pos = torch.sub(obj_root_state[..., :3], self._robot_root_pos_view[:, None], out=self._obj_pos_buf)
+        # Object velocity, mean absolute value as the L1 norm over the 6 components
+        object_vel = torch.linalg.vector_norm(obj_root_state[..., 7:], ord=1, dim=-1, out=self._obj_vel_buf).div_(6)
+
+        # Object reachable: inside the workspace and below a certain height limit
+        # Object stable: either slow speed or not reachable
+        self.obj_reachable, self.obj_stable = compute_obj_reachable_stable(
+            object_pos, object_vel, self._bounds_lo, self._bounds_hi, obj_vel_limit
         )
 
-        # Object stable
-        self.obj_stable = object_pos[:, :, -1] < obj_vel_limit
-
-        # Stable objects are either slow speed or not reachable
-        self.obj_stable = self.obj_stable | ~self.obj_reachable
-
         # At least one object is reachable
         self.env_reachable = self.obj_reachable.any(dim=1)
 
@@ -199,19 +238,33 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             self.sm_wait_time > 1.0
         )
 
+    def _refresh_obj_root_state(self):
+        """Stack the root states of all objects into the (num_envs, num_objs, 13) buffer."""
+        torch.stack([data.root_state_w for data in self._obj_root_views], dim=1, out=self._obj_root_state_buf)
+        # the root state buffer is re-created by the sim, refresh the robot base view along with it
+        self._robot_root_pos_view = self.robot.data.root_state_w[:, :3]
+        self._obj_root_state_step = self._sim_step_counter
+
+    def _get_obj_root_state(self):
+        """Root states of all objects, gathered at most once per physics step.
+
+        Writes of object states between physics steps (resets, drop poses) mark it stale,
+        the buffer is overwritten in place by the next refresh.
+        """
+        if self._obj_root_state_step != self._sim_step_counter:
+            self._refresh_obj_root_state()
+        return self._obj_root_state_buf
 
     def _advance_state_machine(self):
         """Compute the desired state of the robot's end-effector and the gripper."""
 
-        # convert all transformations from (w, x, y, z) to (x, y, z, w)
-        ee_pose = self._get_ee_pose()[:, [0, 1, 2, 4, 5, 6, 3]]
-        self.grasp_pose = self.grasp_pose[:, [0, 1, 2, 4, 5, 6, 3]]
-
-        # convert to warp
-        ee_pose_wp = wp.from_torch(ee_pose.contiguous(), wp.transform)
-        env_reachable_and_stable_wp = wp.from_torch(
-            self.env_reachable_and_stable.contiguous(), wp.bool
+        # refresh the warp inputs in place, the kernel consumes (w, x, y, z) quaternions directly
+        torch.cat(
+            (self.ee_frame.data.target_pos_source[:, 0, :], self.ee_frame.data.target_quat_source[:, 0, :]),
+            -1,
+            out=self._ee_pose_buf,
         )
+        self._env_reachable_and_stable_buf.copy_(self.env_reachable_and_stable)
 
         wp.launch(
                 kernel=infer_state_machine_data,
@@ -224,23 +277,18 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
                     # environment time states
                     self.epi_count_wp,
                     # environment physical states
-                    env_reachable_and_stable_wp,
+                    self._env_reachable_and_stable_wp,
                     # desired robot end effector state
                     self.des_ee_pose_wp,
                     self.des_gripper_state_wp,
                     # current robot end effector state
-                    ee_pose_wp,
+                    self._ee_pose_wp,
                 ],
                 device=self.device,
             )
 
-        # convert transformations back to (w, x, y, z)
-        des_ee_pose = self.des_ee_pose[:, [0, 1, 2, 6, 3, 4, 5]]
-        ee_pose = ee_pose[:, [0, 1, 2, 6, 3, 4, 5]]
-        self.grasp_pose = self.grasp_pose[:, [0, 1, 2, 6, 3, 4, 5]]
-
         # convert to torch
-        return torch.cat((des_ee_pose, self.des_gripper_state.unsqueeze(-1)), -1)
+        return torch.cat((self.des_ee_pose, self.des_gripper_state.unsqueeze(-1)), -1)
 
     def _action_plan(self):
         # Compute the joint commands
@@ -248,15 +296,13 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             joint_pos_des, joint_vel_des = self.controller.compute()
         else:
             jacobian = self.robot.root_physx_view.get_jacobians()[
-                :, self.ee_jacobi_idx, :, self.robot_entity_cfg.joint_ids
-            ]
+                :, self.ee_jacobi_idx
+            ].index_select(-1, self._joint_ids_t)
 
-            joint_pos = self.robot.data.joint_pos[:, self.robot_entity_cfg.joint_ids]
+            joint_pos = self.robot.data.joint_pos.index_select(1, self._joint_ids_t)
 
-            ee_pose_w = self.robot.data.body_state_w[
-                :, self.robot_entity_cfg.body_ids[0], 0:7
-            ].clone()
-            root_pose_w = self.robot.data.root_state_w[:, 0:7].clone()
+            ee_pose_w = self.robot.data.body_state_w[:, self._body_id, 0:7]
+            root_pose_w = self.robot.data.root_state_w[:, 0:7]
 
             ee_pos_b, ee_quat_b = subtract_frame_transforms(
                 root_pose_w[:, 0:3],
@@ -272,15 +318,14 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
 
         joint_pos_des_rel = joint_pos_des - self.joint_pos_init[:, :6]
 
-        joint_pos_des_rel[self.sm_state == STATE_MACHINE["init"]] *= 0.0
-        joint_pos_des_rel[self.sm_state == STATE_MACHINE["init_env"]] *= 0.0
-        joint_pos_des_rel[self.sm_state == STATE_MACHINE["start"]] *= 0.0
+        zero_mask = (self.sm_state.unsqueeze(1) == self._zero_states).any(1)
+        joint_pos_des_rel.mul_((~zero_mask).to(joint_pos_des_rel.dtype).unsqueeze(1))
 
         return joint_pos_des_rel
 
     def step(self, grasp_pose, policy_inference_criteria=torch.tensor([])):
         # Get the grasp pose from the policy
-        self.grasp_pose = grasp_pose
+        self.grasp_pose.copy_(grasp_pose)
 
         # Loop until the simulation frames until policy inference criteria is met
         while not policy_inference_criteria.any():
@@ -356,29 +401,29 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         # Get the normals
         normals_all_env = data_cam["normals"]
 
-        for env_id in ids:
-            pcds = pcds_all_env[env_id] if pcds_all_env is not None else None
-            instances = instances_all_env[env_id] if instances_all_env is not None else None
-            depths = depths_all_env[env_id] if depths_all_env is not None else None
-            normals = normals_all_env[env_id] if normals_all_env is not None else None
-            id_to_labels = []
-            for cam_id in range(n_multiple_cam):
-                # Get the object id from the instance segmentation
-                id_to_label = self.camera_info[cam_id][env_id]["instance_segmentation_fast"]["idToLabels"]
-                id_to_labels.append(id_to_label)
-                
-
-            # Get the rgb image
-            rgbs = data_cam["rgb"][env_id] if "rgb" in data_cam.keys() else None
-            self.save_data(
-                env_id, 
-                rgbs, 
-                pcds,
-                depths, 
-                normals, 
-                instances, 
-                id_to_labels,
-                )
+        # Gather the rows of the requested environments at once: (B, n_cam, H, W, C)
+        ids = torch.as_tensor(ids, dtype=torch.int64, device=self.device).view(-1)
+        if len(ids) == 0:
+            return self.grasp_pose
+        select = lambda data: data.index_select(0, ids) if data is not None else None
+
+        # Get the object id from the instance segmentation
+        id_to_labels = [
+            [self.camera_info[cam_id][env_id]["instance_segmentation_fast"]["idToLabels"] for cam_id in range(n_multiple_cam)]
+            for env_id in ids.tolist()
+        ]
+
+        # Get the rgb image
+        rgbs = data_cam["rgb"] if "rgb" in data_cam.keys() else None
+        self.save_data(
+            ids,
+            select(rgbs),
+            select(pcds_all_env),
+            select(depths_all_env),
+            select(normals_all_env),
+            select(instances_all_env),
+            id_to_labels,
+            )
 
         return self.grasp_pose
 
@@ -396,28 +441,47 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         self._reset_robot(init_id)
         self._reset_idx(init_env_id)
 
+    def _reset_idx(self, env_ids):
+        super()._reset_idx(env_ids)
+        # the reset events move the objects, gather their states again on the next access
+        self._obj_root_state_step = -1
+
     def _record_reward(self, judge_reward):
         """Summarize the reward and print the success message."""
-        for i, env_success in enumerate(self.reward_buf):
-            if env_success and judge_reward[i]:
-                self.reward_recorder[
-                    i, self.epi_step_count[i, 0], self.epi_step_count[i, 1]
-                ] += self.reward_buf[i]
-                # Move object to somewhere away from the bin
-                drop_pose_curr = self.obj_drop_pose.clone()
-                id_tensor = torch.tensor([i], device=self.device)
-                drop_pose_curr[:, :3] += self.scene.env_origins[i]
-                self.scene.rigid_objects[
-                    f"obj_{int(self.obj_chosen[i])}"
-                ].write_root_state_to_sim(drop_pose_curr, id_tensor)
-                print(
-                    f"[INFO] Env {i} succeeded in "
-                    + f"Episode {self.epi_step_count[i, 0]} "
-                    + f"Step {self.epi_step_count[i, 1]} ! "
-                    + f"Current reward: {torch.sum(self.reward_recorder[i, self.epi_step_count[i, 0]])} "
-                )
-                self.sm_state[i] = STATE_MACHINE["init"]
-                self.obj_chosen[i] = -1
+        success_ids = self.env_idx[self.reward_buf.bool() & judge_reward.bool()]
+        if len(success_ids) == 0:
+            return
+        episode = self.epi_step_count[success_ids, 0].long()
+        step = self.epi_step_count[success_ids, 1].long()
+        self.reward_recorder.index_put_(
+            (success_ids, episode, step), self.reward_buf[success_ids], accumulate=True
+        )
+
+        # Move object to somewhere away from the bin, one write per chosen object
+        drop_pose = self._drop_pose_cache[success_ids]
+        obj_chosen = self.obj_chosen[success_ids]
+        for obj_id in obj_chosen.unique().tolist():
+            # no object was chosen, nothing to move
+            if obj_id < 0:
+                continue
+            obj_mask = obj_chosen == obj_id
+            self.scene.rigid_objects[f"obj_{obj_id}"].write_root_state_to_sim(
+                drop_pose[obj_mask], success_ids[obj_mask]
+            )
+            self._obj_root_state_step = -1
+
+        current_reward = self.reward_recorder[success_ids, episode].sum(-1)
+        for i, epi, stp, reward in zip(
+            success_ids.tolist(), episode.tolist(), step.tolist(), current_reward.tolist()
+        ):
+            print(
+                f"[INFO] Env {i} succeeded in "
+                + f"Episode {epi} "
+                + f"Step {stp} ! "
+                + f"Current reward: {reward} "
+            )
+        self.sm_state[success_ids] = STATE_MACHINE["init"]
+        self.obj_chosen[success_ids] = -1
 
     def _reset_robot(self, robot_reset_id):
         """
@@ -441,12 +505,12 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         Visualize markers
         """
         # Obtain quantities from simulation
-        self.robot.data.body_state_w[:, self.robot_entity_cfg.body_ids[0], 0:7]
+        self.robot.data.body_state_w[:, self._body_id, 0:7]
             
         
     def save_data(
         self,
-        env_id,
+        env_ids,
         rgbs,
         pcds,
         depths=None,
@@ -454,137 +518,225 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         instances=None,
         id_to_labels=None,
     ):
+        """Save the camera data of a batch of environments.
 
-        episode, step = self.epi_step_count[env_id, 0], self.epi_step_count[env_id, 1]
+        The images are batched as (B, n_cam, H, W, C), row i belongs to env_ids[i].
+        id_to_labels holds the per-camera instance labels of every row.
+        """
+        env_ids = torch.as_tensor(env_ids, dtype=torch.int64, device=self.device).view(-1)
+        env_ids_list = env_ids.tolist()
+        epi_step = self.epi_step_count[env_ids].tolist()
 
         if id_to_labels is not None:
-            for id_to_label in id_to_labels:
-                for k, v in id_to_label.items():
-                    id_to_label[k] = (
-                        OBJ_LABLE[int(v.split("_")[-1])] if "obj" in v else "-1"
-                    )
+            id_to_labels = [
+                [
+                    {k: OBJ_LABLE[int(v.split("_")[-1])] if "obj" in v else "-1" for k, v in id_to_label.items()}
+                    for id_to_label in env_labels
+                ]
+                for env_labels in id_to_labels
+            ]
 
-        if pcds is not None:
-            for cam_id in range(n_multiple_cam):
-                dp = cv2.normalize(pcds[cam_id][..., -1].cpu().numpy(), None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-                dp = cv2.cvtColor(dp, cv2.COLOR_GRAY2RGB)
-                # cv2.imwrite(f'{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}_camera_{cam_id}_depth.png', dp) #change to the dynamic name back
-
-        # Record object poses of the scene
-        poses = []
-        scene_obj_id = []
-        for obj in range(num_objs):
-            pose = self._get_obj_pose(obj, env_id)
-            if pose[2] > -5e-2:
-                # meter to centimeter
-                pose[:3] *= 100
-                # Get the object pose in 4x4 matrix
-                pose = pose_vector_to_transformation_matrix(pose)                    
-                poses.append(pose)
-                scene_obj_id.append(OBJ_LABLE[obj])
-        # Get the camera pose
-        if len(poses) > 0: 
-            obj_poses_robot = torch.stack(poses)
-        else:
-            obj_poses_robot = None
-            print(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}: No object on the table")
-            
-        data_to_save = {
-                f"camera_{cam_id}": {
-                                    "camera_intrinsics": self.camera[cam_id].data.intrinsic_matrices[env_id],
-                                    "camera_pose": self.get_camera_pose(cam_id, env_id),
-                                    "rgb": rgbs[cam_id].to(torch.uint8) if rgbs is not None else None,
-                                    "depth": (depths[cam_id]*1000).to(torch.int16) if pcds is not None else None,
-                                    "normal": (normals[cam_id]*1000).to(torch.int16) if normals is not None else None,
-                                    "instance": instances[cam_id].to(torch.int8) if instances is not None else None,
-                                    "id_to_labels": id_to_labels[cam_id] if id_to_labels is not None else None,
-                                    "pcd": (pcds[cam_id]*1000).to(torch.int16) if pcds is not None else None,
-                                     } 
-                for cam_id in range(n_multiple_cam)
+        if pcds is not None and save_depth_vis:
+            # Min-max normalize the depth of every camera image to uint8 on the device: (B, n_cam, H, W, 3)
+            dp = pcds[..., -1]
+            dp_min = dp.amin((-2, -1), keepdim=True)
+            dp_max = dp.amax((-2, -1), keepdim=True)
+            dp = ((dp - dp_min) / (dp_max - dp_min + 1e-8) * 255).to(torch.uint8)
+            dp = dp.unsqueeze(-1).expand(*dp.shape, 3).cpu().numpy()
+            for row, (env_id, (episode, step)) in enumerate(zip(env_ids_list, epi_step)):
+                for cam_id in range(n_multiple_cam):
+                    cv2.imwrite(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}_camera_{cam_id}_depth.png", dp[row, cam_id])
+
+        # Object poses of the scene w.r.t. the robot base: (B, num_objs, 7)
+        obj_root_state = self._get_obj_root_state()[env_ids, :, :7]
+        obj_poses = torch.cat(
+            (obj_root_state[..., :3] - self._robot_root_pos_view[env_ids, None], obj_root_state[..., 3:]), -1
+        ).cpu()
+
+        # Camera intrinsics and poses of the batch: n_cam x (B, ...)
+        intrinsics = [self.camera[cam_id].data.intrinsic_matrices[env_ids].cpu() for cam_id in range(n_multiple_cam)]
+        camera_poses = [self.get_camera_pose(cam_id)[env_ids].cpu() for cam_id in range(n_multiple_cam)]
+
+        # Convert the images on the side stream and copy them to the pinned staging slot
+        slot = self._save_slot
+        self._save_slot = (slot + 1) % len(self._save_staging)
+        if self._save_futures[slot] is not None:
+            self._save_futures[slot].result()
+
+        if self._use_cuda:
+            self._save_stream.wait_stream(torch.cuda.current_stream(self.device))
+        with torch.cuda.stream(self._save_stream) if self._use_cuda else nullcontext():
+            images = {
+                "rgb": rgbs.to(torch.uint8, non_blocking=True) if rgbs is not None else None,
+                "normal": quantize_normals_int8(normals) if normals is not None else None,
+                "instance": instances.to(torch.int8, non_blocking=True) if instances is not None else None,
             }
-        
-        data_to_save["obj_poses_robot"] = obj_poses_robot
-        data_to_save["obj_id"] = scene_obj_id
-        
-        torch.save(data_to_save,f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}_data.pt")
-        print(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}: Saved data")
+            # Depth per image and point cloud per image and coordinate as uint8 with min/max metadata
+            for key, data, dims in (("depth", depths, (2, 3, 4)), ("pcd", pcds, (2, 3))):
+                quantized = quantize_uint8(data, dims) if data is not None else (None, None, None)
+                images.update(zip((key, f"{key}_min", f"{key}_max"), quantized))
+            images = {
+                key: self._get_staging(slot, key, image).copy_(image, non_blocking=True) if image is not None else None
+                for key, image in images.items()
+            }
+        if self._use_cuda:
+            self._save_stream.synchronize()
+
+        data_to_save, file_prefixes = [], []
+        for row, (env_id, (episode, step)) in enumerate(zip(env_ids_list, epi_step)):
+            # Record object poses of the scene
+            poses = []
+            scene_obj_id = []
+            for obj in range(num_objs):
+                pose = obj_poses[row, obj]
+                if pose[2] > -5e-2:
+                    # meter to centimeter
+                    pose[:3] *= 100
+                    # Get the object pose in 4x4 matrix
+                    pose = pose_vector_to_transformation_matrix(pose)
+                    poses.append(pose)
+                    scene_obj_id.append(OBJ_LABLE[obj])
+            # Get the camera pose
+            if len(poses) > 0:
+                obj_poses_robot = torch.stack(poses)
+            else:
+                obj_poses_robot = None
+                print(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}: No object on the table")
+
+            env_data = {
+                    f"camera_{cam_id}": {
+                                        "camera_intrinsics": intrinsics[cam_id][row],
+                                        "camera_pose": camera_poses[cam_id][row],
+                                        "id_to_labels": id_to_labels[row][cam_id] if id_to_labels is not None else None,
+                                         }
+                    for cam_id in range(n_multiple_cam)
+                }
+            env_data["obj_poses_robot"] = obj_poses_robot
+            env_data["obj_id"] = scene_obj_id
+            data_to_save.append(env_data)
+            file_prefixes.append(f"{IMG_PATH}/env_{env_id}_epi_{episode}_step_{step}")
+
+        # Write to disk in the background so the simulation does not block on I/O
+        self._save_futures[slot] = self._save_executor.submit(
+            self._write_data, images, data_to_save, file_prefixes
+        )
 
-        
+    def _get_staging(self, slot, key, like):
+        """Get the pinned host staging buffer of a slot for a batch shaped like the given tensor.
+
+        The buffer only grows, smaller batches are written into its leading rows.
+        """
+        buf = self._save_staging[slot].get(key)
+        if buf is None or buf.shape[1:] != like.shape[1:] or buf.dtype != like.dtype or len(buf) < len(like):
+            buf = torch.empty(like.shape, dtype=like.dtype, pin_memory=self._use_cuda)
+            self._save_staging[slot][key] = buf
+        return buf[:len(like)]
+
+    def _write_data(self, images, data_to_save, file_prefixes):
+        """Serialize the host copy of a batch of data, runs in the saving thread pool.
+
+        The files are written by write_scene_data. Depth and point cloud are uint8 with
+        their range in "{key}_min"/"{key}_max" (see quantize_uint8), normals are int8 scaled by 127.
+        """
+        for row, (env_data, file_prefix) in enumerate(zip(data_to_save, file_prefixes)):
+            for cam_id in range(n_multiple_cam):
+                env_data[f"camera_{cam_id}"].update(
+                    {key: image[row, cam_id] for key, image in images.items() if image is not None}
+                )
+            write_scene_data(file_prefix, env_data)
+            print(f"{file_prefix}: Saved data")
+
+    def close(self):
+        """Wait for the pending data to be written before closing the environment."""
+        # may run from __del__ after a failed __init__ or a previous close
+        save_executor = getattr(self, "_save_executor", None)
+        if save_executor is not None:
+            self._save_executor = None
+            save_executor.shutdown(wait=True)
+            # report the writes that were never waited for, raising here would escape from __del__
+            for future in self._save_futures:
+                if future is not None and future.exception() is not None:
+                    print(f"[ERROR] Failed to write data: {future.exception()!r}")
+            self._save_futures = [None] * len(self._save_futures)
+        super().close()
 
     def _get_obj_pos(self, id_obj):
-        root_pose_w = self.robot.data.root_state_w[:, 0:3].clone()
-        return self.objs[id_obj].data.root_state_w[:, 0:3].clone() - root_pose_w
+        return self._get_obj_root_state()[:, id_obj, 0:3] - self._robot_root_pos_view
 
     def _get_obj_pose(self, id_obj, id_env):
-        root_pose_w = self.robot.data.root_state_w[id_env, 0:3].clone()
-        obj_pos = self.objs[id_obj].data.root_state_w[id_env, 0:3].clone() - root_pose_w
-        obj_quat = self.objs[id_obj].data.root_state_w[id_env, 3:7].clone()
-        return torch.cat((obj_pos, obj_quat), -1)
+        obj_state = self._get_obj_root_state()[id_env, id_obj]
+        obj_pos = obj_state[0:3] - self._robot_root_pos_view[id_env]
+        return torch.cat((obj_pos, obj_state[3:7]), -1)
 
     def _get_obj_vel(self, id_obj):
-        return self.objs[id_obj].data.root_state_w[:, 7:].clone()
+        # read-only view of the stacked object states, clone to keep it beyond the current step
+        return self._get_obj_root_state()[:, id_obj, 7:]
 
     def _get_ee_pose(self):
-        view_pos_rob = self.ee_frame.data.target_pos_source.clone()[:, 0, :]
-        view_quat_rob = self.ee_frame.data.target_quat_source.clone()[:, 0, :]
+        view_pos_rob = self.ee_frame.data.target_pos_source[:, 0, :]
+        view_quat_rob = self.ee_frame.data.target_quat_source[:, 0, :]
         return torch.cat((view_pos_rob, view_quat_rob), -1)
 
     def _get_ee_vel(self):
         ee_vel = self.robot.data.body_state_w[
-            :, self.robot_entity_cfg.body_ids[0], 7:
+            :, self._body_id, 7:
         ].clone()
         ee_vel_abs = torch.mean(torch.abs(ee_vel), -1)
         return ee_vel_abs
 
     def get_camera_pose(self, cam_id, env_id = None):
-        view_pos_w = self.scene[f"camera_{cam_id}"].data.pos_w.clone()
-        view_quat_w = self.scene[f"camera_{cam_id}"].data.quat_w_ros.clone()
-        view_pos_rob = view_pos_w - self.scene[robot_name].data.root_state_w[:, 0:3].clone()
+        # also called by the observation terms while the env is constructed, so the robot is looked up here
+        view_pos_w = self.scene[f"camera_{cam_id}"].data.pos_w
+        view_quat_w = self.scene[f"camera_{cam_id}"].data.quat_w_ros
+        view_pos_rob = view_pos_w - self.scene[robot_name].data.root_state_w[:, 0:3]
         view_pose_rob = torch.cat((view_pos_rob, view_quat_w), -1)
         return view_pose_rob[env_id] if env_id is not None else view_pose_rob
 
     def get_pointcloud_map(self, ids, cam_id = 0, vis=True):
-        pcds = []
-        for env_id in ids:
-            depth = self.camera[cam_id].data.output["distance_to_image_plane"][env_id]
-            pointcloud = create_pointcloud_from_depth(
-                intrinsic_matrix=self.camera.data.intrinsic_matrices[env_id],
-                depth=depth,
-                position=self.camera[cam_id].data.pos_w[env_id],
-                orientation=self.camera[cam_id].data.quat_w_ros[env_id],
-                device=self.device,
-            )
-            if pointcloud.size()[0] > 0 and vis and self.sim.has_gui():
-                indices = torch.randperm(pointcloud.size()[0])[:5000]
-                sampled_point_cloud = pointcloud[indices]
-                self.pc_markers[env_id].visualize(translations=sampled_point_cloud)
-            pcds.append(pointcloud.view(cam_width, cam_height, 3).permute(1, 0, 2))
-        return pcds
+        # Unproject the depth of all requested envs at once, invalid points are kept to preserve the image layout
+        ids = torch.as_tensor(ids, dtype=torch.int64, device=self.device).view(-1)
+        camera_data = self.camera[cam_id].data
+        pointclouds = create_pointcloud_from_depth(
+            intrinsic_matrix=camera_data.intrinsic_matrices[ids],
+            depth=camera_data.output["distance_to_image_plane"][ids],
+            keep_invalid=True,
+            position=camera_data.pos_w[ids],
+            orientation=camera_data.quat_w_ros[ids],
+            device=self.device,
+        )
+        if vis and self.sim.has_gui():
+            for env_id, pointcloud in zip(ids.tolist(), pointclouds):
+                pointcloud = pointcloud[pointcloud.isfinite().all(-1)]
+                if pointcloud.size()[0] > 0:
+                    indices = torch.randperm(pointcloud.size()[0])[:5000]
+                    sampled_point_cloud = pointcloud[indices]
+                    self.pc_markers[env_id].visualize(translations=sampled_point_cloud)
+        return pointclouds.view(-1, cam_width, cam_height, 3).permute(0, 2, 1, 3)
 
     def rep_write(self, obs_buf, ids):
         # Get the view pose
         camera_info = self.camera.data.info
 
-        for id in ids:
-            episode, step = self.epi_step_count[id]
+        # Transfer only the rows of the requested envs to numpy, once for the whole batch
+        ids = torch.as_tensor(ids, dtype=torch.int64, device=self.device).view(-1)
+        single_cam_data = convert_dict_to_backend(
+            {key: data[ids] for key, data in obs_buf["policy"].items()}, backend="numpy"
+        )
+        epi_step = self.epi_step_count[ids].tolist()
 
+        for row, (id, (episode, step)) in enumerate(zip(ids.tolist(), epi_step)):
             # Write the replicator output
             rep_output = {"annotators": {}}
-            data_cam = {}
-            single_cam_data = convert_dict_to_backend(
-                obs_buf["policy"], backend="numpy"
-            )
-            for key, data in zip(single_cam_data.keys(), single_cam_data.values()):
+            for key, data in single_cam_data.items():
                 info = camera_info[id][key]
                 if info is not None:
                     rep_output["annotators"][key] = {
-                        "render_product": {"data": data[id], **info}
+                        "render_product": {"data": data[row], **info}
                     }
                 else:
                     rep_output["annotators"][key] = {
-                        "render_product": {"data": data[id]}
+                        "render_product": {"data": data[row]}
                     }
-                data_cam[key] = data
             rep_output["trigger_outputs"] = {
                 "on_time": f"epi_{episode}_step_{step}_env"
             }
@@ -628,17 +780,10 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
         # Convert the dictionary to a DataFrame
         df_new_data = pd.DataFrame(data)
 
-        # Check if the Excel file exists
-        if os.path.exists(file_name):
-            # Read the existing data
-            df_existing = pd.read_csv(file_name)
-            # Append new data
-            df_combined = pd.concat([df_existing, df_new_data], ignore_index=True)
-            # Write combined data back to the Excel file
-            df_combined.to_csv(file_name, index=False)
-        else:
-            # If the file does not exist, create and write the data
-            df_new_data.to_csv(file_name, index=False)
+        # Append the new rows only, the header is written when the file is created
+        df_new_data.to_csv(
+            file_name, mode="a", header=not os.path.exists(file_name), index=False
+        )
 
 
     def get_grasp_poses_from_hdf5(self, obj_id, env_id, img, camera_pose):
@@ -655,60 +800,57 @@ class AIR_RLTaskEnv(ManagerBasedRLEnv):
             analytical=True,
         )
 
-        grasp_poses = []
-        for grasp in grasp_dict["paralleljaw_pregrasp_transform"]:
-            # Get the contact point and the second point on the gripper finger surface
-            approach_vec = torch.tensor(grasp[0:3], device=self.device) 
-            baseline = torch.tensor(grasp[3:6], device=self.device)
-            contact_pt = torch.tensor(grasp[6:9], device=self.device) / 100 
-            pt2 = contact_pt + baseline * grasp[9] / 100
-            grasp_pos = pt2 - approach_vec * 0.1
-
-            # Convert the grasp pose to 6D pose using the transformation matrix of the object from the simulation
-            grasp_pose_obj = from_contact_to_6D(grasp)
-            # Convert the transformation matrix to a pose vector
-            grasp_pose_obj = transformation_matrix_to_pose_vector(torch.Tensor(grasp_pose_obj)).to(self.device)
-            # Convert to meters
-            grasp_pose_obj[:3] = grasp_pos
-            
-            # Transform the grasp pose to the robot frame
-            obj_pose_w = self._get_obj_pose(self.obj_chosen[env_id], env_id)
-            grasp_pos, grasp_quat = combine_frame_transforms(obj_pose_w[:3], obj_pose_w[3:], grasp_pose_obj[:3], grasp_pose_obj[3:])
-            contact_pt, _ = combine_frame_transforms(obj_pose_w[:3], obj_pose_w[3:], contact_pt)
-            pt2, _ = combine_frame_transforms(obj_pose_w[:3], obj_pose_w[3:], pt2)
-            mid_pt = (contact_pt + pt2) / 2
-            
-            # Visualize the grasp pose
-            grasp_pos_img = robot_point_to_image(grasp_pos, camera_pose)
-            contact_pt_img = robot_point_to_image(contact_pt, camera_pose)
-            pt2_img = robot_point_to_image(pt2, camera_pose)
-            mid_pt_img = robot_point_to_image(mid_pt, camera_pose)
-            img = cv2.line(
-                img,
-                (int(contact_pt_img[0]), int(contact_pt_img[1])),
-                (int(pt2_img[0]), int(pt2_img[1])),
-                (0, 255, 0),
-                1,
-            )
-            img = cv2.line(
-                img,
-                (int(mid_pt_img[0]), int(mid_pt_img[1])),
-                (int(grasp_pos_img[0]), int(grasp_pos_img[1])),
-                (0, 0, 255),
-                1,
-            )
-            img = cv2.circle(
-                img, (int(mid_pt_img[0]), int(mid_pt_img[1])), 2, (0, 0, 0), -1
-            )
-            
-            grasp_poses.append(torch.cat((grasp_pos, grasp_quat), -1))
-        grasp_poses = torch.stack(grasp_poses)
-        cv2.imwrite(f"env_{env_id}_grasp_viz.png", img)
+        # Stack all grasps into one (N, 10) tensor: approach vector, baseline, contact point, width
+        grasps = torch.as_tensor(
+            np.asarray(grasp_dict["paralleljaw_pregrasp_transform"]), dtype=torch.float32, device=self.device
+        )
+
+        # Get the contact point and the second point on the gripper finger surface
+        approach_vec = grasps[:, 0:3]
+        baseline = grasps[:, 3:6]
+        contact_pt = grasps[:, 6:9] / 100
+        pt2 = contact_pt + baseline * grasps[:, 9:10] / 100
+        grasp_pos = pt2 - approach_vec * 0.1
+
+        # Orientation of the 6D grasp pose, the rotation columns are (baseline, approach x baseline, approach)
+        grasp_rot = torch.stack((baseline, torch.linalg.cross(approach_vec, baseline), approach_vec), dim=-1)
+        grasp_quat = quat_from_matrix(grasp_rot)
+
+        # Transform the grasp poses to the robot frame
+        obj_pose_w = self._get_obj_pose(self.obj_chosen[env_id], env_id).expand(len(grasps), -1)
+        grasp_pos, grasp_quat = combine_frame_transforms(obj_pose_w[:, :3], obj_pose_w[:, 3:], grasp_pos, grasp_quat)
+        contact_pt, _ = combine_frame_transforms(obj_pose_w[:, :3], obj_pose_w[:, 3:], contact_pt)
+        pt2, _ = combine_frame_transforms(obj_pose_w[:, :3], obj_pose_w[:, 3:], pt2)
+        mid_pt = (contact_pt + pt2) / 2
+        grasp_poses = torch.cat((grasp_pos, grasp_quat), -1)
 
         # Get grasp with maximum grasp score
-        grasp_pose = grasp_poses[
-            grasp_dict["paralleljaw_pregrasp_score"].index(
-                max(grasp_dict["paralleljaw_pregrasp_score"])
-            )]
+        best = int(np.argmax(grasp_dict["paralleljaw_pregrasp_score"]))
+        grasp_pose = grasp_poses[best]
+
+        # Visualize the best grasp pose
+        grasp_pos_img = robot_point_to_image(grasp_pos[best], camera_pose)
+        contact_pt_img = robot_point_to_image(contact_pt[best], camera_pose)
+        pt2_img = robot_point_to_image(pt2[best], camera_pose)
+        mid_pt_img = robot_point_to_image(mid_pt[best], camera_pose)
+        img = cv2.line(
+            img,
+            (int(contact_pt_img[0]), int(contact_pt_img[1])),
+            (int(pt2_img[0]), int(pt2_img[1])),
+            (0, 255, 0),
+            1,
+        )
+        img = cv2.line(
+            img,
+            (int(mid_pt_img[0]), int(mid_pt_img[1])),
+            (int(grasp_pos_img[0]), int(grasp_pos_img[1])),
+            (0, 0, 255),
+            1,
+        )
+        img = cv2.circle(
+            img, (int(mid_pt_img[0]), int(mid_pt_img[1])), 2, (0, 0, 0), -1
+        )
+        cv2.imwrite(f"env_{env_id}_grasp_viz.png", img)
+
         self.pc_markers[env_id].visualize(translations=grasp_poses[:, :3])
         return grasp_pose
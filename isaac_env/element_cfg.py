@@ -37,6 +37,7 @@ random_drop_obj = True # drop object randomly under the table
 collect_data = False # collect data for training
 save_data = True # save data during training 
 read_from_hdf5 = False # read data from hdf5 file to get grasp pose
+save_depth_vis = False # save normalized depth images along with the data for debugging
 
 # Learning Environment parameters
 successive_grasp_failure_limit = 12 # number of successive grasp failure before reset the environment
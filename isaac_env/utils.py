@@ -1,6 +1,9 @@
+import json
+
 import numpy as np
 import torch
 from omni.isaac.lab.utils.math import matrix_from_quat, quat_from_matrix
+from safetensors.torch import save_file
 
 from .element_cfg import *
 
@@ -53,6 +56,97 @@ def perpendicular_grasp_orientation(normal, tensor=True):
     return quaternion
 
 
+@torch.jit.script
+def compute_obj_reachable_stable(
+    obj_pos: torch.Tensor, obj_vel: torch.Tensor, lo: torch.Tensor, hi: torch.Tensor, vel_limit: float
+):
+    """
+    Fused check of whether the objects are inside the workspace bounds and stable.
+
+    Args:
+    - obj_pos (torch.Tensor): Object positions w.r.t. the robot base, shape [num_envs, num_objs, 3].
+    - obj_vel (torch.Tensor): Object velocity magnitudes, shape [num_envs, num_objs].
+    - lo, hi (torch.Tensor): Exclusive lower and upper workspace bounds, shape [3].
+    - vel_limit (float): Velocity below which an object is regarded as stable.
+
+    Returns:
+    - obj_reachable (torch.Tensor): Objects inside the workspace, shape [num_envs, num_objs].
+    - obj_stable (torch.Tensor): Objects that are slow or not reachable, shape [num_envs, num_objs].
+    """
+    obj_reachable = ((obj_pos > lo) & (obj_pos < hi)).all(-1)
+    obj_stable = (obj_vel < vel_limit) | ~obj_reachable
+    return obj_reachable, obj_stable
+
+
+def quantize_uint8(data, dims):
+    """
+    Quantize a tensor to uint8 with a min-max scale over the given dimensions.
+
+    Args:
+    - data (torch.Tensor): The tensor to quantize.
+    - dims (tuple): The dimensions sharing one scale, e.g. (H, W, C) for one scale per image.
+
+    Returns:
+    - quantized (torch.Tensor): The uint8 tensor, data ~ data_min + quantized / 255 * (data_max - data_min).
+    - data_min (torch.Tensor): Minimum over dims, with the reduced dimensions kept.
+    - data_max (torch.Tensor): Maximum over dims, with the reduced dimensions kept.
+    """
+    data_min = data.amin(dims, keepdim=True)
+    data_max = data.amax(dims, keepdim=True)
+    quantized = ((data - data_min) / (data_max - data_min).clamp_min(1e-8) * 255).round().to(torch.uint8)
+    return quantized, data_min, data_max
+
+
+def dequantize_uint8(quantized, data_min, data_max):
+    """
+    Invert quantize_uint8, the error is at most half a quantization step (data_max - data_min) / 510.
+    """
+    return data_min + quantized.to(data_min.dtype) / 255 * (data_max - data_min)
+
+
+def quantize_normals_int8(normals):
+    """
+    Quantize unit normals in [-1, 1] to int8, normals ~ quantized / 127.
+    """
+    return (normals * 127).round().clamp(-128, 127).to(torch.int8)
+
+
+def dequantize_normals_int8(quantized):
+    """
+    Invert quantize_normals_int8.
+    """
+    return quantized.float() / 127
+
+
+def write_scene_data(file_prefix, scene_data):
+    """
+    Write the data of one scene to {file_prefix}_data.safetensors and {file_prefix}_data.json.
+
+    Args:
+    - file_prefix (str): Path of the sample without the "_data.*" suffix.
+    - scene_data (dict): Tensors and labels, nested at most one level deep, e.g. {"camera_0": {"rgb": ...}}.
+      The tensors are stored under flat keys such as "camera_0/rgb", the labels in the json with
+      the same nesting. None entries are skipped.
+    """
+    tensors, labels = {}, {}
+    for key, value in scene_data.items():
+        items = value.items() if isinstance(value, dict) else [(None, value)]
+        for sub_key, data in items:
+            if data is None:
+                continue
+            if isinstance(data, torch.Tensor):
+                # own host copy, safetensors rejects tensors that share storage
+                tensors[key if sub_key is None else f"{key}/{sub_key}"] = data.detach().to("cpu", copy=True).contiguous()
+            elif sub_key is None:
+                labels[key] = data
+            else:
+                labels.setdefault(key, {})[sub_key] = data
+    # the labels go first so a complete sample exists once the tensor file shows up
+    with open(f"{file_prefix}_data.json", "w") as f:
+        json.dump(labels, f)
+    save_file(tensors, f"{file_prefix}_data.safetensors")
+
+
 def robot_point_to_image(world_point, cam_pose):
 
     # Assuming the extrinsic parameters are known
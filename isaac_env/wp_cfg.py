@@ -44,6 +44,25 @@ def approach_pose_from_grasp_pose(grasp_pose: wp.transform):
     return wp.transform(wp.transform_get_translation(grasp_pose) - v2,
                         wp.transform_get_rotation(grasp_pose))
 
+@wp.func
+def load_transform_wxyz(pose: wp.array2d(dtype=float), tid: int):
+    """Read a pose stored as (x, y, z, qw, qx, qy, qz) into a transformation."""
+    return wp.transform(wp.vec3(pose[tid, 0], pose[tid, 1], pose[tid, 2]),
+                        wp.quat(pose[tid, 4], pose[tid, 5], pose[tid, 6], pose[tid, 3]))
+
+@wp.func
+def store_transform_wxyz(pose: wp.array2d(dtype=float), tid: int, t: wp.transform):
+    """Write a transformation as (x, y, z, qw, qx, qy, qz) pose."""
+    pos = wp.transform_get_translation(t)
+    rot = wp.transform_get_rotation(t)
+    pose[tid, 0] = pos[0]
+    pose[tid, 1] = pos[1]
+    pose[tid, 2] = pos[2]
+    pose[tid, 3] = rot[3]
+    pose[tid, 4] = rot[0]
+    pose[tid, 5] = rot[1]
+    pose[tid, 6] = rot[2]
+
 @wp.kernel
 def infer_state_machine_data(
     # environment state machine recorders
@@ -54,11 +73,11 @@ def infer_state_machine_data(
     epi_count_wp: wp.array(dtype=wp.int32),
     # environment physical states
     env_stable: wp.array(dtype=bool),
-    # desired robot end effector state
-    des_ee_pose: wp.array(dtype=wp.transform),
+    # desired robot end effector state, (x, y, z, qw, qx, qy, qz)
+    des_ee_pose: wp.array2d(dtype=float),
     des_gripper_state: wp.array(dtype=float),
-     # current robot end effector state
-    ee_pose: wp.array(dtype=wp.transform),
+     # current robot end effector state, (x, y, z, qw, qx, qy, qz)
+    ee_pose: wp.array2d(dtype=float),
 ):
     # retrieve thread id
     tid = wp.tid()
@@ -66,7 +85,7 @@ def infer_state_machine_data(
     state = sm_state[tid]
     # decide next state
     if state == PickSmState.init_env:
-        des_ee_pose[tid] = ee_pose[tid]
+        store_transform_wxyz(des_ee_pose, tid, load_transform_wxyz(ee_pose, tid))
         des_gripper_state[tid] = GripperState.OPEN
         # reset the environment including the robot and objects   
         epi_count_wp[tid] = wp.add(epi_count_wp[tid], 1)
@@ -78,13 +97,13 @@ def infer_state_machine_data(
         # or wait until the environment is stable after grasping
         # when the environment is stable, 
         # robot starts to take photo and choose the object
-        des_ee_pose[tid] = ee_pose[tid]
+        store_transform_wxyz(des_ee_pose, tid, load_transform_wxyz(ee_pose, tid))
         des_gripper_state[tid] = GripperState.OPEN
         if env_stable[tid] == True or sm_wait_time[tid] >= PickSmLimitTime.start:
             sm_state[tid] = PickSmState.choose_object
     
     elif state == PickSmState.choose_object:
-        des_ee_pose[tid] = ee_pose[tid]
+        store_transform_wxyz(des_ee_pose, tid, load_transform_wxyz(ee_pose, tid))
         des_gripper_state[tid] = GripperState.OPEN
         # not wait for a while
         sm_state[tid] = PickSmState.init_env
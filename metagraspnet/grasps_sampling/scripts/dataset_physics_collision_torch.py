@@ -12,9 +12,11 @@ import sys
 import threading as th
 
 import h5py
+import json
 import numpy as np
 import torch
 import trimesh
+from safetensors.torch import load_file
 
 # Print maximum length in console.
 np.set_printoptions(threshold=sys.maxsize)
@@ -154,6 +156,34 @@ def load_single_keypts_config(hdf5_path):
     return ret
 
 
+def load_scene_data(scene_prefix):
+    """
+    Load a scene captured by the simulation envs into one nested dict.
+    The tensors are stored in {scene_prefix}.safetensors with keys like "camera_0/rgb",
+    the labels in {scene_prefix}.json. Depth, point cloud and normals are returned as float.
+    """
+    with open(f"{scene_prefix}.json", "r") as f:
+        scene = json.load(f)
+    for key, tensor in load_file(f"{scene_prefix}.safetensors").items():
+        if "/" in key:
+            group, sub_key = key.split("/", 1)
+            scene.setdefault(group, {})[sub_key] = tensor
+        else:
+            scene[key] = tensor
+    # Back to metric depth, point cloud and unit normals, the inverse of the quantization in
+    # isaac_env.utils (not imported here since isaac_env needs Isaac Sim)
+    for group in scene.values():
+        if not isinstance(group, dict):
+            continue
+        for key in ("depth", "pcd"):
+            if f"{key}_min" in group:
+                data_min, data_max = group.pop(f"{key}_min"), group.pop(f"{key}_max")
+                group[key] = data_min + group[key].to(data_min.dtype) / 255 * (data_max - data_min)
+        if "normal" in group and group["normal"].dtype == torch.int8:
+            group["normal"] = group["normal"].float() / 127
+    return scene
+
+
 def create_easy_gripper(
     color=[0, 255, 0, 140], sections=6, show_axis=False, width=None
 ):
@@ -346,9 +376,13 @@ class CollisionWithScene:
         self.box_dir = box_dir
         self.root = root_dir
         self.sid = sid
-        self.scene = torch.load(
-                f"{scene_root_dir}/{self.sid}.pt", map_location=torch.device("cpu")
-            )
+        # evaluated scenes are stored as .pt, raw captures as .safetensors + .json
+        if os.path.exists(f"{scene_root_dir}/{self.sid}.pt"):
+            self.scene = torch.load(
+                    f"{scene_root_dir}/{self.sid}.pt", map_location=torch.device("cpu")
+                )
+        else:
+            self.scene = load_scene_data(f"{scene_root_dir}/{self.sid}")
 
     def load_potential_grasps_and_generate_trimesh_scene(self):
         """1) Generate a twin scene in trimesh (much simpler) and check for gripper collision.
@@ -892,8 +926,8 @@ def read_in_scene(
     # f = h5py.File(str(hdf5_path), 'r')
 
     try:
-        f = torch.load(scene_dir, map_location="cpu")  # pt file
-        assert f["obj_poses_robot"] is not None
+        f = load_scene_data(os.path.splitext(scene_dir)[0])  # safetensors + json file
+        assert f.get("obj_poses_robot") is not None
     except:
         print(f"Scene {scene_dir} -> File is incorrect, the scene will be removed.")
         return None, None, None, None
@@ -977,7 +1011,7 @@ def evaluate_scene(scene_dir):
 
     if not valid_grasp_file:
         print(f"Scene {scene_id} -> No valid grasps, the data will be removed.")
-        target = glob.glob(scene_dir)
+        target = glob.glob(f"{scene_root_dir}/{scene_id}.*")
         for t in target:
             os.remove(t)
         return
@@ -989,10 +1023,15 @@ def evaluate_scene(scene_dir):
 
 if __name__ == "__main__":
     "Typical usage"
-    file_name = "env_*_epi_*_step_*_data.pt"
+    file_names = ["env_*_epi_*_step_*_data.safetensors"]
     scene_dir = pathlib.Path(scene_root_dir)
 
-    scenes = glob.glob(str(scene_dir / file_name))
+    # one entry per scene id, the evaluated {scene_id}.pt sits next to the captured file
+    scenes = {}
+    for file_name in file_names:  # in order of preference
+        for scene in glob.glob(str(scene_dir / file_name)):
+            scenes.setdefault(os.path.basename(scene).split(".")[0], scene)
+    scenes = sorted(scenes.values())
     if test:
         for scene in scenes:
             evaluate_scene(scene)
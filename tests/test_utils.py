@@ -0,0 +1,35 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("omni.isaac.lab")
+
+from isaac_env.utils import (
+    dequantize_normals_int8,
+    dequantize_uint8,
+    quantize_normals_int8,
+    quantize_uint8,
+)
+
+
+def test_uint8_round_trip():
+    # (B, n_cam, H, W, 3) point clouds with one scale per image and coordinate
+    data = torch.rand(2, 3, 16, 16, 3) * 2.0 - 0.5
+    quantized, data_min, data_max = quantize_uint8(data, (2, 3))
+    assert quantized.dtype == torch.uint8
+    assert data_min.shape == (2, 3, 1, 1, 3)
+
+    restored = dequantize_uint8(quantized, data_min, data_max)
+    step = (data_max - data_min) / 255
+    assert torch.all((restored - data).abs() <= step / 2 + 1e-6)
+
+
+def test_uint8_round_trip_constant():
+    data = torch.full((1, 1, 4, 4, 1), 0.7)
+    restored = dequantize_uint8(*quantize_uint8(data, (2, 3, 4)))
+    assert torch.allclose(restored, data)
+
+
+def test_normals_int8_round_trip():
+    normals = torch.nn.functional.normalize(torch.randn(4, 8, 8, 3), dim=-1)
+    restored = dequantize_normals_int8(quantize_normals_int8(normals))
+    assert torch.all((restored - normals).abs() <= 0.5 / 127 + 1e-6)